@@ -0,0 +1,614 @@
+"""download_java.py - download a portable JRE and JDK for Windows
+
+python-javabridge is licensed under the BSD license.  See the
+accompanying file LICENSE for details.
+
+Copyright (c) 2003-2009 Massachusetts Institute of Technology
+Copyright (c) 2009-2013 Broad Institute
+All rights reserved.
+
+"""
+
+import os
+import asyncio
+import functools
+import logging
+import shutil
+import struct
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .locate import is_linux, is_mac, is_win, is_win64
+
+try:
+    from tqdm import tqdm as _TQDM
+except ModuleNotFoundError:
+    # progress bars are skipped when tqdm is missing
+    _TQDM = None
+
+try:
+    import aiohttp
+except ImportError:
+    # optional; without it the JRE and JDK are downloaded sequentially
+    aiohttp = None
+
+try:
+    import deflate  # libdeflate bindings, ~2x faster inflate than zlib
+except ImportError:
+    deflate = None
+
+try:
+    import httpx  # optional; multiplexes both gdrive requests over HTTP/2
+except ImportError:
+    httpx = None
+
+try:
+    from stream_unzip import stream_unzip
+except ImportError:
+    stream_unzip = None
+
+logger = logging.getLogger(__name__)
+
+#: Base folder where the portable Java installations are unpacked
+JAVA_BASE_PATH = os.path.join(os.path.expanduser('~'), 'acdc-java')
+
+GDRIVE_URL = 'https://docs.google.com/uc?export=download'
+
+#: Google Drive ids and uncompressed sizes of the portable Java archives
+JRE_GDRIVE_FILE_ID = '1ux7pVBWJlBFHDnW0hRMNxFTcGHRFDpO3'
+JRE_FILE_SIZE = 112_000_000
+JDK_GDRIVE_FILE_ID = '1fZ0PSKybaYmWFzyE5tPZA9mQF0cmJSeH'
+JDK_FILE_SIZE = 130_000_000
+
+CHUNK_SIZE = 1 << 20
+
+
+@functools.lru_cache(maxsize=1)
+def get_java_info():
+    """Return (java_path, jdk_path, url, os_foldername) for this platform"""
+    if is_win64:
+        os_foldername = 'win64'
+    elif is_win:
+        os_foldername = 'win'
+    elif is_mac:
+        os_foldername = 'macOS'
+    else:
+        os_foldername = 'linux'
+    url = 'https://github.com/SchmollerLab/Cell_ACDC'
+    folder_path = os.path.join(JAVA_BASE_PATH, os_foldername)
+    java_path = os.path.join(folder_path, 'jre')
+    jdk_path = os.path.join(folder_path, 'jdk')
+    return java_path, jdk_path, url, os_foldername
+
+
+def get_confirm_token(response):
+    """Return the Google Drive download-warning token, if any"""
+    for key, value in response.cookies.items():
+        if key.startswith('download_warning'):
+            return value
+    return None
+
+
+class _ProgressWriter:
+    """File-like sink that forwards writes and batches progress updates"""
+
+    def __init__(self, f, pbar, progress, update_every):
+        self._f = f
+        self._pbar = pbar
+        self._progress = progress
+        self._update_every = update_every
+        self._pending = 0
+
+    def write(self, chunk):
+        written = self._f.write(chunk)
+        self._pending += len(chunk)
+        if self._pending >= self._update_every:
+            self.flush_progress()
+        return written
+
+    def flush_progress(self):
+        if not self._pending:
+            return
+        if self._pbar is not None:
+            self._pbar.update(self._pending)
+        if self._progress is not None:
+            self._progress.emit(self._pending)
+        self._pending = 0
+
+
+def save_response_content(
+        response, destination, file_size=None, desc='Java', progress=None
+    ):
+    """Stream the body of `response` to the file `destination`"""
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    # write next to the destination so the final rename stays on the
+    # same filesystem (atomic, no copy+delete fallback)
+    temp_dst = destination + '.part'
+    # a 206 means the server honoured our Range header and we append to
+    # the partial file; any other status restarts from byte 0
+    resuming = response.status_code == 206 and os.path.exists(temp_dst)
+    initial = os.path.getsize(temp_dst) if resuming else 0
+    pbar = _TQDM(
+        total=file_size, initial=initial, unit='B', unit_scale=True,
+        unit_divisor=1024, desc=desc
+    ) if _TQDM is not None else None
+    # read from the raw urllib3 stream to skip requests' per-chunk
+    # generator overhead; raw.read never yields keep-alive empty chunks
+    response.raw.decode_content = True
+    # no preallocation here: the resume offset is derived from the
+    # .part size, so the file must never be longer than the bytes
+    # actually received (a preallocated file killed mid-transfer would
+    # resume past the data and rename zero-fill as a valid archive)
+    with open(temp_dst, 'ab' if resuming else 'wb') as f:
+        # batch progress updates to ~100 per download; every emit wakes
+        # the GUI event loop, so per-chunk signalling thrashes Qt
+        update_every = max((file_size or 0) // 100, CHUNK_SIZE)
+        sink = _ProgressWriter(f, pbar, progress, update_every)
+        shutil.copyfileobj(response.raw, sink, length=CHUNK_SIZE)
+        sink.flush_progress()
+    if pbar is not None:
+        pbar.close()
+    os.replace(temp_dst, destination)
+
+
+class _IterReader:
+    """Adapt an iterator of byte chunks to the raw-stream read interface"""
+
+    decode_content = True
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def read(self, size=-1):
+        return next(self._chunks, b'')
+
+
+class _HttpxResponseAdapter:
+    """Duck-type the requests attributes the download sinks use"""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.raw = _IterReader(response.iter_bytes(CHUNK_SIZE))
+
+    def iter_content(self, chunk_size=CHUNK_SIZE):
+        while True:
+            chunk = self.raw.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _make_httpx_client():
+    """An httpx client, multiplexing over HTTP/2 when h2 is installed"""
+    try:
+        return httpx.Client(
+            http2=True, follow_redirects=True, timeout=httpx.Timeout(30.0)
+        )
+    except ImportError:
+        # the h2 extra is not installed; HTTP/1.1 still reuses the
+        # connection via keep-alive
+        return httpx.Client(follow_redirects=True,
+                            timeout=httpx.Timeout(30.0))
+
+
+def _download_from_gdrive_httpx(file_id, destination, file_size=None,
+                                desc='Java', progress=None):
+    """download_from_gdrive over a single multiplexed HTTP/2 connection"""
+    with _make_httpx_client() as client:
+        # one-byte probe; see download_from_gdrive
+        response = client.get(
+            GDRIVE_URL, params={'id': file_id},
+            headers={'Range': 'bytes=0-0'}
+        )
+        token = get_confirm_token(response)
+        if token:
+            params = {'id': file_id, 'confirm': token}
+        else:
+            params = {'id': file_id}
+        headers = {}
+        temp_dst = destination + '.part'
+        if os.path.isfile(temp_dst):
+            headers['Range'] = f'bytes={os.path.getsize(temp_dst)}-'
+        with client.stream(
+                'GET', GDRIVE_URL, params=params, headers=headers
+            ) as response:
+            if response.status_code == 416:
+                # see download_from_gdrive: the .part already holds
+                # the whole file
+                os.replace(temp_dst, destination)
+                return
+            response.raise_for_status()
+            save_response_content(
+                _HttpxResponseAdapter(response), destination,
+                file_size=file_size, desc=desc, progress=progress
+            )
+
+
+def download_from_gdrive(file_id, destination, file_size=None, desc='Java',
+                         progress=None):
+    """Download a shared file from Google Drive to `destination`"""
+    if httpx is not None:
+        _download_from_gdrive_httpx(
+            file_id, destination, file_size=file_size, desc=desc,
+            progress=progress
+        )
+        return
+    session = requests.Session()
+    # probe with a one-byte Range so the confirm-token check never
+    # transfers the warning page (or the file itself) in full
+    response = session.get(
+        GDRIVE_URL, params={'id': file_id},
+        headers={'Range': 'bytes=0-0'}
+    )
+    token = get_confirm_token(response)
+    if token:
+        params = {'id': file_id, 'confirm': token}
+    else:
+        params = {'id': file_id}
+    headers = {}
+    temp_dst = destination + '.part'
+    if os.path.isfile(temp_dst):
+        # resume an interrupted download where it stopped; servers that
+        # ignore the Range header answer 200 and we restart from scratch
+        headers['Range'] = f'bytes={os.path.getsize(temp_dst)}-'
+    response = session.get(
+        GDRIVE_URL, params=params, stream=True, headers=headers
+    )
+    if response.status_code == 416:
+        # the requested range starts at the end of the file: the .part
+        # already holds every byte, a previous run just crashed between
+        # the last write and the rename. Promote it.
+        response.close()
+        os.replace(temp_dst, destination)
+        return
+    # without this check an error body would be streamed to disk and
+    # renamed over the destination as if it were the archive
+    response.raise_for_status()
+    save_response_content(
+        response, destination, file_size=file_size, desc=desc,
+        progress=progress
+    )
+
+
+def _is_safe_entry_name(name):
+    """Reject entry names that could escape the extraction directory"""
+    if name.startswith('/') or '\\' in name or ':' in name:
+        return False
+    return '..' not in name.split('/')
+
+
+def _read_raw_entry(zip_ref, info):
+    """Read the compressed bytes of one entry straight from the archive"""
+    fp = zip_ref.fp
+    fp.seek(info.header_offset)
+    header = fp.read(30)
+    name_len, extra_len = struct.unpack('<HH', header[26:30])
+    fp.seek(info.header_offset + 30 + name_len + extra_len)
+    return fp.read(info.compress_size)
+
+
+def _extract_shard(zip_path, extract_to_path, infos):
+    """Extract a shard of zip entries with a private file handle"""
+    # ZipFile is not thread-safe on a shared handle; re-opening is cheap
+    # because the central directory is parsed once per open
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for info in infos:
+            if (deflate is None or info.is_dir()
+                    or info.compress_type != zipfile.ZIP_DEFLATED
+                    or not _is_safe_entry_name(info.filename)):
+                zip_ref.extract(info, extract_to_path)
+                continue
+            data = deflate.deflate_decompress(
+                _read_raw_entry(zip_ref, info), info.file_size
+            )
+            # ZipFile.extract verifies the CRC while inflating; do the
+            # same here so a corrupt transfer cannot slip through
+            if zlib.crc32(data) != info.CRC:
+                raise zipfile.BadZipFile(
+                    f'Bad CRC-32 for file {info.filename!r}'
+                )
+            dst = os.path.join(extract_to_path, *info.filename.split('/'))
+            with open(dst, 'wb') as f:
+                f.write(data)
+
+
+def extract_zip(zip_path, extract_to_path):
+    """Extract the archive at `zip_path` into `extract_to_path`"""
+    # deliberately no os.fsync per entry: forcing thousands of small
+    # files to the platter serializes on metadata flushes and has been
+    # measured at up to ~60x slower than letting the page cache batch
+    # the writes. If durability is ever needed, sync the volume once
+    # after the loop instead.
+    logger.info(f'Extracting to {extract_to_path}...')
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        infos = zip_ref.infolist()
+    # create every directory up front so the workers never race in
+    # os.makedirs; unsafe names are skipped here and routed through
+    # ZipFile.extract's sanitization in _extract_shard
+    dirnames = {
+        os.path.dirname(os.path.join(extract_to_path, info.filename))
+        for info in infos if _is_safe_entry_name(info.filename)
+    }
+    for dirname in sorted(dirnames):
+        os.makedirs(dirname, exist_ok=True)
+    # zlib releases the GIL while inflating, so threads scale on the
+    # thousands of small entries in the JDK archive
+    n_workers = min(os.cpu_count() or 1, len(infos)) or 1
+    shards = [infos[i::n_workers] for i in range(n_workers)]
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        list(executor.map(
+            lambda shard: _extract_shard(zip_path, extract_to_path, shard),
+            shards
+        ))
+
+
+def _stream_extract_zip(response, extract_to_path, file_size=None,
+                        desc='Java'):
+    """Extract a zip archive from an HTTP response.
+
+    With stream_unzip installed each entry is inflated as its bytes
+    arrive: one fused download->inflate->write pass with constant
+    memory and no intermediate archive on disk. Without it the body is
+    saved to a temporary ``.zip`` next to the destination and handed to
+    the parallel extract_zip, trading the extra pass for multi-core
+    inflation.
+    """
+    response.raw.decode_content = True
+    pbar = _TQDM(
+        total=file_size, unit='B', unit_scale=True,
+        unit_divisor=1024, desc=desc
+    ) if _TQDM is not None else None
+
+    def body():
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if chunk:
+                if pbar is not None:
+                    pbar.update(len(chunk))
+                yield chunk
+
+    if stream_unzip is not None:
+        for name, size, chunks in stream_unzip(body()):
+            name = name.decode('utf-8', errors='replace')
+            safe = _is_safe_entry_name(name) and not name.endswith('/')
+            if safe:
+                dst = os.path.join(extract_to_path, *name.split('/'))
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                f = open(dst, 'wb')
+            # the member's chunks must be drained even when skipped
+            for chunk in chunks:
+                if safe:
+                    f.write(chunk)
+            if safe:
+                f.close()
+        if pbar is not None:
+            pbar.close()
+        return
+    # sibling of the destination so the buffered archive never lands on
+    # a different (slower or smaller) filesystem than the extraction
+    zip_dst = extract_to_path + '.zip'
+    os.makedirs(os.path.dirname(zip_dst), exist_ok=True)
+    with open(zip_dst, 'wb') as f:
+        for chunk in body():
+            f.write(chunk)
+    if pbar is not None:
+        pbar.close()
+    extract_zip(zip_dst, extract_to_path)
+    os.remove(zip_dst)
+
+
+def _stream_extract_from_gdrive_httpx(file_id, extract_to_path,
+                                      file_size=None, desc='Java'):
+    """The streamed bootstrap transfer over a single HTTP/2 connection"""
+    with _make_httpx_client() as client:
+        # one-byte probe; see download_from_gdrive
+        response = client.get(
+            GDRIVE_URL, params={'id': file_id},
+            headers={'Range': 'bytes=0-0'}
+        )
+        token = get_confirm_token(response)
+        if token:
+            params = {'id': file_id, 'confirm': token}
+        else:
+            params = {'id': file_id}
+        with client.stream('GET', GDRIVE_URL, params=params) as response:
+            _stream_extract_zip(
+                _HttpxResponseAdapter(response), extract_to_path,
+                file_size=file_size, desc=desc
+            )
+
+
+def _commit_extracted(partial_path, extract_to_path):
+    """Publish a finished extraction at its final path in one rename"""
+    if os.path.isdir(extract_to_path):
+        # leftovers of a run that predates the staged extraction; the
+        # missing bin/ marker already proved the tree incomplete
+        shutil.rmtree(extract_to_path)
+    os.rename(partial_path, extract_to_path)
+
+
+def _download_extract_from_gdrive(file_id, extract_to_path, file_size=None,
+                                  desc='Java'):
+    """Download a zip from Google Drive and extract it in a single pass.
+
+    The fused stream cannot resume after a dropped connection, so on
+    any failure the transfer is retried as a plain resumable file
+    download (download_from_gdrive + extract_zip) instead.
+    """
+    # extract into a staging sibling and rename only once the stream
+    # finished: download_jre/download_jdk take the existence of bin/ as
+    # "installed", and bin/ entries land within the first seconds of a
+    # multi-minute stream, so a killed process must never leave a
+    # half-extracted tree at the final path
+    partial = extract_to_path + '.partial'
+    if os.path.isdir(partial):
+        shutil.rmtree(partial)
+    try:
+        if httpx is not None:
+            _stream_extract_from_gdrive_httpx(
+                file_id, partial, file_size=file_size, desc=desc
+            )
+            _commit_extracted(partial, extract_to_path)
+            return
+        session = requests.Session()
+        # probe with a one-byte Range so the confirm-token check never
+        # transfers the warning page (or the file itself) in full
+        response = session.get(
+            GDRIVE_URL, params={'id': file_id},
+            headers={'Range': 'bytes=0-0'}
+        )
+        token = get_confirm_token(response)
+        if token:
+            params = {'id': file_id, 'confirm': token}
+            response = session.get(GDRIVE_URL, params=params, stream=True)
+        else:
+            response = session.get(
+                GDRIVE_URL, params={'id': file_id}, stream=True
+            )
+        _stream_extract_zip(
+            response, partial, file_size=file_size, desc=desc
+        )
+    except Exception as err:
+        logger.warning(
+            f'Streamed download of {desc} failed ({err}); '
+            'retrying as a resumable file download...'
+        )
+        if os.path.isdir(partial):
+            shutil.rmtree(partial)
+        zip_dst = extract_to_path + '.zip'
+        download_from_gdrive(file_id, zip_dst, file_size=file_size, desc=desc)
+        extract_zip(zip_dst, partial)
+        os.remove(zip_dst)
+    _commit_extracted(partial, extract_to_path)
+
+
+async def _download_extract_one_async(session, file_id, extract_to_path,
+                                      file_size, desc):
+    """Download one Google Drive zip with aiohttp and extract it"""
+    params = {'id': file_id}
+    async with session.get(GDRIVE_URL, params=params) as response:
+        token = None
+        for key, morsel in response.cookies.items():
+            if key.startswith('download_warning'):
+                token = morsel.value
+    if token:
+        params = {'id': file_id, 'confirm': token}
+    zip_dst = extract_to_path + '.zip'
+    os.makedirs(os.path.dirname(zip_dst), exist_ok=True)
+    # the concurrent path cannot resume, so the zip is removed in the
+    # finally even on failure: a stale partial archive would otherwise
+    # linger forever once the sequential fallback succeeds without it
+    try:
+        with open(zip_dst, 'wb') as f:
+            async with session.get(GDRIVE_URL, params=params) as response:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    f.write(chunk)
+        # stage and rename like _download_extract_from_gdrive, so an
+        # abort never leaves a half-extracted tree at the final path
+        partial = extract_to_path + '.partial'
+        if os.path.isdir(partial):
+            shutil.rmtree(partial)
+        loop = asyncio.get_running_loop()
+        # zip inflation is blocking; hand it to the default executor so
+        # the other download keeps streaming
+        await loop.run_in_executor(None, extract_zip, zip_dst, partial)
+        _commit_extracted(partial, extract_to_path)
+    finally:
+        if os.path.exists(zip_dst):
+            os.remove(zip_dst)
+
+
+async def _download_extract_gather_async(jobs):
+    """Run several download-and-extract jobs concurrently"""
+    connector = aiohttp.TCPConnector(limit=len(jobs))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(
+            _download_extract_one_async(session, *job) for job in jobs
+        ))
+
+
+# warm-path caches: once an installation has been seen on disk, later
+# calls cost a single stat instead of re-probing candidate paths
+_cached_jre_path = None
+_cached_jdk_path = None
+
+
+def download_jre():
+    """Download and unpack the portable JRE if not already present"""
+    global _cached_jre_path
+    if _cached_jre_path is not None and os.path.isdir(_cached_jre_path):
+        return _cached_jre_path
+    java_path, jdk_path, url, os_foldername = get_java_info()
+    if os.path.exists(os.path.join(java_path, 'bin')):
+        _cached_jre_path = java_path
+        return java_path
+    logger.info(f'Downloading Java Runtime Environment to {java_path}...')
+    _download_extract_from_gdrive(
+        JRE_GDRIVE_FILE_ID, java_path, file_size=JRE_FILE_SIZE,
+        desc='Java Runtime Environment'
+    )
+    _cached_jre_path = java_path
+    return java_path
+
+
+def download_jdk():
+    """Download and unpack the portable JDK if not already present"""
+    global _cached_jdk_path
+    if _cached_jdk_path is not None and os.path.isdir(_cached_jdk_path):
+        return _cached_jdk_path
+    java_path, jdk_path, url, os_foldername = get_java_info()
+    if os.path.exists(os.path.join(jdk_path, 'bin')):
+        _cached_jdk_path = jdk_path
+        return jdk_path
+    logger.info(f'Downloading Java Development Kit to {jdk_path}...')
+    _download_extract_from_gdrive(
+        JDK_GDRIVE_FILE_ID, jdk_path, file_size=JDK_FILE_SIZE,
+        desc='Java Development Kit'
+    )
+    _cached_jdk_path = jdk_path
+    return jdk_path
+
+
+def download_java():
+    """Ensure the portable JRE and JDK are available.
+
+    Returns (jre_path, jdk_path, url) where `url` points at the project
+    the archives are distributed from.
+    """
+    global _cached_jre_path, _cached_jdk_path
+    java_path, jdk_path, url, os_foldername = get_java_info()
+    if not os_foldername.startswith('win'):
+        # on Linux and macOS Java is expected to be installed system-wide
+        return java_path, jdk_path, url
+    jre_missing = not os.path.exists(os.path.join(java_path, 'bin'))
+    jdk_missing = not os.path.exists(os.path.join(jdk_path, 'bin'))
+    if aiohttp is not None and jre_missing and jdk_missing:
+        logger.info(f'Downloading Java to {os.path.dirname(java_path)}...')
+        jobs = [
+            (JRE_GDRIVE_FILE_ID, java_path, JRE_FILE_SIZE,
+             'Java Runtime Environment'),
+            (JDK_GDRIVE_FILE_ID, jdk_path, JDK_FILE_SIZE,
+             'Java Development Kit'),
+        ]
+        try:
+            asyncio.run(_download_extract_gather_async(jobs))
+        except Exception as err:
+            # fall through to the sequential path, which retries each
+            # archive as a resumable file download
+            logger.warning(f'Concurrent download failed ({err}); '
+                           'falling back to sequential downloads...')
+        else:
+            _cached_jre_path = java_path
+            _cached_jdk_path = jdk_path
+            return java_path, jdk_path, url
+    jre_path = download_jre()
+    jdk_path = download_jdk()
+    return jre_path, jdk_path, url
+
+
+if __name__ == '__main__':
+    jre_path, jdk_path, url = download_java()
+    print(jre_path)
+    print(jdk_path)
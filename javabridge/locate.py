@@ -10,7 +10,10 @@ All rights reserved.lo
 """
 
 import ctypes
+import functools
+import glob
 import os
+import shutil
 import sys
 import logging
 import subprocess
@@ -34,17 +37,17 @@ def is_mingw():
     if (os.getenv("DISTUTILS_USE_SDK") != None or os.getenv("MSSdk") != None):
         return False
 
-    mingw32 = ""
-    mingw64 = ""
-    if (os.getenv("MINGW32_PREFIX")):
-        mingw32 = os.getenv("MINGW32_PREFIX")
-    if (os.getenv("MINGW64_PREFIX")):
-        mingw64 = os.getenv("MINGW64_PREFIX")
+    mingw32 = os.getenv("MINGW32_PREFIX") or ""
+    mingw64 = os.getenv("MINGW64_PREFIX") or ""
 
-    # if any invocation of gcc works, then we assume the user wants mingw:
-    test = "gcc --version > NUL 2>&1"
-    if (os.system(test) == 0 or os.system(mingw32+test) == 0 or os.system(mingw64+test) == 0):
+    # if gcc is available (plain or via a MINGW prefix), we assume the
+    # user wants mingw; shutil.which scans PATH without spawning the
+    # three cmd.exe subprocesses os.system needed
+    if shutil.which("gcc") is not None:
         return True
+    for prefix in (mingw32, mingw64):
+        if prefix and shutil.which(prefix + "gcc") is not None:
+            return True
 
     return False
 
@@ -53,7 +56,7 @@ def is_mingw():
 is_linux = sys.platform.startswith('linux')
 is_mac = sys.platform == 'darwin'
 is_win = sys.platform.startswith("win")
-is_win64 = (is_win and (os.environ["PROCESSOR_ARCHITECTURE"] == "AMD64"))
+is_win64 = (is_win and (os.environ.get("PROCESSOR_ARCHITECTURE") == "AMD64"))
 is_msvc = (is_win and
            ((sys.version_info.major == 2 and sys.version_info.minor >= 6) or
             (sys.version_info.major == 3)))
@@ -68,20 +71,39 @@ if is_win:
 
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _query_registry_java_home():
+    """Look up the JavaHome of a system JRE in the Windows registry
+
+    Returns None when there is no registry (non-Windows) or no JRE key.
+    The result is cached so repeated finder calls open the registry at
+    most once per process.
+    """
+    if not is_win:
+        return None
+    try:
+        with winreg.OpenKey(
+                winreg.HKEY_LOCAL_MACHINE, r"SOFTWARE\JavaSoft\JRE"
+            ) as jre_key:
+            current_version, _ = winreg.QueryValueEx(jre_key, "CurrentVersion")
+            with winreg.OpenKey(jre_key, current_version) as version_key:
+                java_home, _ = winreg.QueryValueEx(version_key, "JavaHome")
+                return java_home
+    except OSError:
+        return None
+
+
+@functools.lru_cache(maxsize=1)
 def find_javahome():
     """Download JAVA_HOME if it doesn't exist"""
-    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-    try:
-        from cellacdc.myutils import download_java
-    except ModuleNotFoundError as err:
-        print(err)
-        print('*'*60)
-        print('`javabridge` requires the Cell-ACDC package. Please install it with `pip install cellacdc`. Thank you for your patience!')
-        print('-'*60)
-        exit()
+    java_home = _query_registry_java_home()
+    if java_home is not None:
+        return java_home
+    from .download_java import download_java
     jre_path, jdk_path, url = download_java()
     return jre_path
 
+@functools.lru_cache(maxsize=1)
 def find_jdk():
     """Find the JDK under Windows"""
     if 'JDK_HOME' in os.environ:
@@ -94,62 +116,78 @@ def find_jdk():
     if is_mac:
         return find_javahome()
     if is_win:
-        try:
-            from cellacdc.myutils import download_java
-        except ModuleNotFoundError as err:
-            print(err)
-            print('*'*60)
-            print('`javabridge` requires the Cell-ACDC package. Please install it with `pip install cellacdc`. Thank you for your patience!')
-            print('-'*60)
-            exit()
+        from .download_java import download_java
         jre_path, jdk_path, url = download_java()
         return jdk_path
 
+@functools.lru_cache(maxsize=1)
+def _jdk_bin():
+    """The JDK bin directory, resolved once per process"""
+    return os.path.join(find_jdk(), "bin")
+
+def _find_jdk_cmd(name):
+    """Find the executable `name` in the JDK bin directory"""
+    cmd = os.path.join(_jdk_bin(), name + ".exe")
+    if os.path.isfile(cmd):
+        return cmd
+    raise RuntimeError("Failed to find %s.exe in its usual location under the JDK (%s)" % (name, cmd))
+
+@functools.lru_cache(maxsize=1)
 def find_javac_cmd():
     """Find the javac executable"""
     if is_win:
-        jdk_base = find_jdk()
-        javac = os.path.join(jdk_base, "bin", "javac.exe")
-        if os.path.isfile(javac):
-            return javac
-        raise RuntimeError("Failed to find javac.exe in its usual location under the JDK (%s)" % javac)
+        return _find_jdk_cmd("javac")
     else:
         # will be along path for other platforms
         return "javac"
 
+@functools.lru_cache(maxsize=1)
 def find_jar_cmd():
-    """Find the javac executable"""
+    """Find the jar executable"""
     if is_win:
-        jdk_base = find_jdk()
-        javac = os.path.join(jdk_base, "bin", "jar.exe")
-        if os.path.isfile(javac):
-            return javac
-        raise RuntimeError("Failed to find jar.exe in its usual location under the JDK (%s)" % javac)
+        return _find_jdk_cmd("jar")
     else:
         # will be along path for other platforms
         return "jar"
 
 
+@functools.lru_cache(maxsize=1)
 def find_jre_bin_jdk_so():
     """Finds the jre bin dir and the jdk shared library file"""
-    jvm_dir = None
+    jre_bin = None
     java_home = find_javahome()
     if java_home is not None:
-        found_jvm = False
+        lib_prefix = '' if is_win else 'lib'
+        lib_suffix = '.dll' if is_win else ('.dylib' if is_mac else '.so')
+        jvm_name = lib_prefix + "jvm" + lib_suffix
         for jre_home in (java_home, os.path.join(java_home, "jre"), os.path.join(java_home, 'default-java'), os.path.join(java_home, 'default-runtime')):
             jre_bin = os.path.join(jre_home, 'bin')
             jre_libexec = os.path.join(jre_home, 'bin' if is_win else 'lib')
-            arches = ('amd64', 'i386', '') if is_linux else ('',)
-            lib_prefix = '' if is_win else 'lib'
-            lib_suffix = '.dll' if is_win else ('.dylib' if is_mac else '.so')
-            for arch in arches:
-                for place_to_look in ('client','server'):
-                    jvm_dir = os.path.join(jre_libexec, arch, place_to_look)
-                    jvm_so = os.path.join(jvm_dir, lib_prefix + "jvm" + lib_suffix)
-                    if os.path.isfile(jvm_so):
-                        return (jre_bin, jvm_so)
+            # one recursive directory scan instead of a stat per
+            # arch/client/server candidate
+            jvm_sos = glob.glob(
+                os.path.join(jre_libexec, '**', jvm_name), recursive=True
+            )
+            if jvm_sos:
+                # glob order is filesystem-dependent; keep the historical
+                # client-before-server preference, then sort for stability
+                vm_rank = {'client': 0, 'server': 1}
+                jvm_sos.sort(key=lambda so: (
+                    vm_rank.get(os.path.basename(os.path.dirname(so)), 2), so
+                ))
+                return (jre_bin, jvm_sos[0])
     return (jre_bin, None)
 
+
+def _clear_caches():
+    """Forget the memoized locations (mainly useful in tests)"""
+    for finder in (find_javahome, find_jdk, find_javac_cmd, find_jar_cmd,
+                   find_jre_bin_jdk_so, _jdk_bin, _query_registry_java_home):
+        finder.cache_clear()
+    from .download_java import get_java_info
+    get_java_info.cache_clear()
+
+
 if __name__ == '__main__':
     jdk_path = find_jdk()
     jre_path = find_javahome()
@@ -0,0 +1,343 @@
+'''test_download_java.py - test the Java bootstrap helpers
+
+python-javabridge is licensed under the BSD license.  See the
+accompanying file LICENSE for details.
+
+Copyright (c) 2003-2009 Massachusetts Institute of Technology
+Copyright (c) 2009-2013 Broad Institute
+All rights reserved.
+
+'''
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from javabridge import download_java
+
+
+class _FakeRaw:
+    decode_content = False
+
+    def __init__(self, payload):
+        self._buffer = io.BytesIO(payload)
+
+    def read(self, size=-1):
+        return self._buffer.read(size)
+
+
+class _FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.raw = _FakeRaw(payload)
+        self.status_code = status_code
+
+    def iter_content(self, chunk_size):
+        while True:
+            chunk = self.raw.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class _FakeCookies:
+    def __init__(self, cookies):
+        self._cookies = cookies
+
+    def items(self):
+        return list(self._cookies.items())
+
+
+class _ProgressSpy:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, value):
+        self.emitted.append(value)
+
+
+def _make_zip(entries):
+    """Build an in-memory zip from a dict of name -> bytes"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        for name, payload in entries.items():
+            zip_ref.writestr(name, payload)
+    return buffer.getvalue()
+
+
+class TestConfirmToken(unittest.TestCase):
+    def test_01_01_token_found(self):
+        response = _FakeResponse(b'')
+        response.cookies = _FakeCookies(
+            {'NID': 'x', 'download_warning_13x': 'abc123'}
+        )
+        self.assertEqual(download_java.get_confirm_token(response), 'abc123')
+
+    def test_01_02_no_token(self):
+        response = _FakeResponse(b'')
+        response.cookies = _FakeCookies({'NID': 'x'})
+        self.assertIsNone(download_java.get_confirm_token(response))
+
+
+class TestSafeEntryName(unittest.TestCase):
+    def test_02_01_accepts_normal_names(self):
+        self.assertTrue(download_java._is_safe_entry_name('jre/bin/java.exe'))
+        self.assertTrue(download_java._is_safe_entry_name('readme.txt'))
+
+    def test_02_02_rejects_escapes(self):
+        for name in ('/etc/passwd', '../evil', 'jre/../../evil',
+                     'jre\\evil', 'c:/evil'):
+            self.assertFalse(download_java._is_safe_entry_name(name), name)
+
+
+class TestProgressWriter(unittest.TestCase):
+    def test_03_01_writes_pass_through(self):
+        sink_file = io.BytesIO()
+        writer = download_java._ProgressWriter(sink_file, None, None, 1000)
+        writer.write(b'abc')
+        self.assertEqual(sink_file.getvalue(), b'abc')
+
+    def test_03_02_updates_are_batched(self):
+        progress = _ProgressSpy()
+        writer = download_java._ProgressWriter(
+            io.BytesIO(), None, progress, 10
+        )
+        writer.write(b'x' * 4)
+        self.assertEqual(progress.emitted, [])
+        writer.write(b'x' * 7)
+        self.assertEqual(progress.emitted, [11])
+        writer.write(b'x' * 3)
+        writer.flush_progress()
+        self.assertEqual(progress.emitted, [11, 3])
+
+
+class TestSaveResponseContent(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.destination = os.path.join(self.tempdir, 'out', 'java.zip')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def read_destination(self):
+        with open(self.destination, 'rb') as f:
+            return f.read()
+
+    def test_04_01_fresh_download(self):
+        response = _FakeResponse(b'payload')
+        download_java.save_response_content(response, self.destination)
+        self.assertEqual(self.read_destination(), b'payload')
+        self.assertFalse(os.path.exists(self.destination + '.part'))
+
+    def test_04_02_resume_appends_on_206(self):
+        os.makedirs(os.path.dirname(self.destination))
+        with open(self.destination + '.part', 'wb') as f:
+            f.write(b'first-')
+        response = _FakeResponse(b'second', status_code=206)
+        download_java.save_response_content(response, self.destination)
+        self.assertEqual(self.read_destination(), b'first-second')
+
+    def test_04_03_restart_on_200(self):
+        # a server that ignored the Range header answers 200 and the
+        # stale partial file must be discarded
+        os.makedirs(os.path.dirname(self.destination))
+        with open(self.destination + '.part', 'wb') as f:
+            f.write(b'stale')
+        response = _FakeResponse(b'fresh', status_code=200)
+        download_java.save_response_content(response, self.destination)
+        self.assertEqual(self.read_destination(), b'fresh')
+
+    def test_04_04_progress_reports_all_bytes(self):
+        progress = _ProgressSpy()
+        response = _FakeResponse(b'x' * 1000)
+        download_java.save_response_content(
+            response, self.destination, file_size=1000, progress=progress
+        )
+        self.assertEqual(sum(progress.emitted), 1000)
+
+
+class TestExtractZip(unittest.TestCase):
+    ENTRIES = {
+        'jre/bin/java.exe': b'\x00' * 5000,
+        'jre/lib/rt.jar': os.urandom(20000),
+        'jre/readme.txt': b'hello',
+    }
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.zip_path = os.path.join(self.tempdir, 'java.zip')
+        self.extract_to = os.path.join(self.tempdir, 'extracted')
+        with open(self.zip_path, 'wb') as f:
+            f.write(_make_zip(self.ENTRIES))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def assertExtracted(self, extract_to):
+        for name, payload in self.ENTRIES.items():
+            path = os.path.join(extract_to, *name.split('/'))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), payload, name)
+
+    def test_05_01_round_trip(self):
+        download_java.extract_zip(self.zip_path, self.extract_to)
+        self.assertExtracted(self.extract_to)
+
+    @unittest.skipIf(download_java.deflate is None,
+                     'libdeflate not installed')
+    def test_05_02_corrupt_entry_raises(self):
+        # flip a byte of the recorded CRC in the central directory: the
+        # entry still inflates cleanly, so only the CRC verification
+        # can notice the mismatch
+        with open(self.zip_path, 'r+b') as f:
+            archive = f.read()
+            name_at = archive.rfind(b'jre/lib/rt.jar')
+            # the central file header puts the CRC-32 16 bytes after
+            # its signature and the name 46 bytes after it
+            crc_at = name_at - 46 + 16
+            f.seek(crc_at)
+            f.write(bytes([archive[crc_at] ^ 0xFF]))
+        self.assertRaises(
+            zipfile.BadZipFile,
+            download_java.extract_zip, self.zip_path, self.extract_to
+        )
+
+    def test_05_03_hostile_entry_stays_inside_root(self):
+        with zipfile.ZipFile(self.zip_path, 'a') as zip_ref:
+            zip_ref.writestr('../../rogue_dir/evil.txt', b'pwned')
+        download_java.extract_zip(self.zip_path, self.extract_to)
+        self.assertExtracted(self.extract_to)
+        for parent in (self.tempdir, os.path.dirname(self.tempdir)):
+            self.assertFalse(
+                os.path.exists(os.path.join(parent, 'rogue_dir')), parent
+            )
+
+
+class TestStreamExtractZip(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.extract_to = os.path.join(self.tempdir, 'extracted')
+        self.payload = _make_zip(TestExtractZip.ENTRIES)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    @unittest.skipIf(download_java.stream_unzip is None,
+                     'stream_unzip not installed')
+    def test_06_01_fused_round_trip(self):
+        response = _FakeResponse(self.payload)
+        download_java._stream_extract_zip(
+            response, self.extract_to, file_size=len(self.payload)
+        )
+        for name, payload in TestExtractZip.ENTRIES.items():
+            path = os.path.join(self.extract_to, *name.split('/'))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), payload, name)
+
+    def test_06_02_spooled_fallback(self):
+        # without stream_unzip the body is spooled to a .zip and
+        # extracted in a second pass; no archive must be left behind
+        saved = download_java.stream_unzip
+        download_java.stream_unzip = None
+        try:
+            response = _FakeResponse(self.payload)
+            download_java._stream_extract_zip(response, self.extract_to)
+        finally:
+            download_java.stream_unzip = saved
+        self.assertFalse(os.path.exists(self.extract_to + '.zip'))
+        for name, payload in TestExtractZip.ENTRIES.items():
+            path = os.path.join(self.extract_to, *name.split('/'))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), payload, name)
+
+
+class _FakeSession:
+    """requests.Session stand-in: a probe response, then a stream one"""
+
+    def __init__(self, responses):
+        self._responses = iter(responses)
+        self.requested_headers = []
+
+    def get(self, url, params=None, stream=False, headers=None):
+        self.requested_headers.append(headers or {})
+        return next(self._responses)
+
+
+class _FakeRequests:
+    def __init__(self, responses):
+        self.session = _FakeSession(responses)
+
+    def Session(self):
+        return self.session
+
+
+class TestDownloadFromGdrive(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.destination = os.path.join(self.tempdir, 'out', 'java.zip')
+        self.saved_requests = download_java.requests
+        self.saved_httpx = download_java.httpx
+        download_java.httpx = None
+
+    def tearDown(self):
+        download_java.requests = self.saved_requests
+        download_java.httpx = self.saved_httpx
+        shutil.rmtree(self.tempdir)
+
+    def make_probe(self):
+        probe = _FakeResponse(b'')
+        probe.cookies = _FakeCookies({})
+        return probe
+
+    def test_08_01_416_promotes_complete_part(self):
+        os.makedirs(os.path.dirname(self.destination))
+        with open(self.destination + '.part', 'wb') as f:
+            f.write(b'whole archive')
+        stream = _FakeResponse(b'range error body', status_code=416)
+        stream.close = lambda: None
+        download_java.requests = _FakeRequests([self.make_probe(), stream])
+        download_java.download_from_gdrive('FILEID', self.destination)
+        with open(self.destination, 'rb') as f:
+            self.assertEqual(f.read(), b'whole archive')
+
+    def test_08_02_error_status_raises(self):
+        stream = _FakeResponse(b'quota exceeded', status_code=500)
+        stream.raise_for_status = lambda: (_ for _ in ()).throw(
+            IOError('500 Server Error')
+        )
+        download_java.requests = _FakeRequests([self.make_probe(), stream])
+        self.assertRaises(
+            IOError,
+            download_java.download_from_gdrive, 'FILEID', self.destination
+        )
+        self.assertFalse(os.path.exists(self.destination))
+
+
+class TestCommitExtracted(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.final = os.path.join(self.tempdir, 'jre')
+        self.partial = self.final + '.partial'
+        os.makedirs(os.path.join(self.partial, 'bin'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_07_01_publishes_partial(self):
+        download_java._commit_extracted(self.partial, self.final)
+        self.assertTrue(os.path.isdir(os.path.join(self.final, 'bin')))
+        self.assertFalse(os.path.exists(self.partial))
+
+    def test_07_02_replaces_incomplete_install(self):
+        # a tree without bin/ left by an older, unstaged run must not
+        # block publishing the freshly extracted one
+        os.makedirs(os.path.join(self.final, 'lib'))
+        download_java._commit_extracted(self.partial, self.final)
+        self.assertTrue(os.path.isdir(os.path.join(self.final, 'bin')))
+        self.assertFalse(os.path.isdir(os.path.join(self.final, 'lib')))
+
+
+if __name__ == '__main__':
+    unittest.main()
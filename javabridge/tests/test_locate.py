@@ -0,0 +1,84 @@
+'''test_locate.py - test the architecture and Java discovery helpers
+
+python-javabridge is licensed under the BSD license.  See the
+accompanying file LICENSE for details.
+
+Copyright (c) 2003-2009 Massachusetts Institute of Technology
+Copyright (c) 2009-2013 Broad Institute
+All rights reserved.
+
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from javabridge import download_java, locate
+
+
+class TestClearCaches(unittest.TestCase):
+    def test_01_01_all_memoized_helpers_are_cleared(self):
+        # only prime the caches that never trigger a download
+        locate._query_registry_java_home()
+        download_java.get_java_info()
+        locate._clear_caches()
+        for helper in (locate.find_javahome, locate.find_jdk,
+                       locate.find_javac_cmd, locate.find_jar_cmd,
+                       locate.find_jre_bin_jdk_so, locate._jdk_bin,
+                       locate._query_registry_java_home,
+                       download_java.get_java_info):
+            self.assertEqual(helper.cache_info().currsize, 0, helper)
+
+
+class TestQueryRegistry(unittest.TestCase):
+    @unittest.skipIf(locate.is_win, 'registry exists on Windows')
+    def test_02_01_none_without_registry(self):
+        self.assertIsNone(locate._query_registry_java_home())
+
+
+class TestFindJreBinJdkSo(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.java_home = os.path.join(self.tempdir, 'jre')
+        self.saved_find_javahome = locate.find_javahome
+        locate.find_javahome = lambda: self.java_home
+        locate.find_jre_bin_jdk_so.cache_clear()
+
+    def tearDown(self):
+        locate.find_javahome = self.saved_find_javahome
+        locate.find_jre_bin_jdk_so.cache_clear()
+        shutil.rmtree(self.tempdir)
+
+    def make_jvm(self, vm_dir):
+        lib_prefix = '' if locate.is_win else 'lib'
+        lib_suffix = ('.dll' if locate.is_win
+                      else ('.dylib' if locate.is_mac else '.so'))
+        jvm_name = lib_prefix + 'jvm' + lib_suffix
+        libexec = os.path.join(self.java_home,
+                               'bin' if locate.is_win else 'lib')
+        jvm_path = os.path.join(libexec, vm_dir, jvm_name)
+        os.makedirs(os.path.dirname(jvm_path))
+        with open(jvm_path, 'wb'):
+            pass
+        return jvm_path
+
+    def test_03_01_finds_jvm(self):
+        jvm_path = self.make_jvm('server')
+        jre_bin, jvm_so = locate.find_jre_bin_jdk_so()
+        self.assertEqual(jre_bin, os.path.join(self.java_home, 'bin'))
+        self.assertEqual(jvm_so, jvm_path)
+
+    def test_03_02_prefers_client_over_server(self):
+        self.make_jvm('server')
+        client_path = self.make_jvm('client')
+        jre_bin, jvm_so = locate.find_jre_bin_jdk_so()
+        self.assertEqual(jvm_so, client_path)
+
+    def test_03_03_none_when_missing(self):
+        jre_bin, jvm_so = locate.find_jre_bin_jdk_so()
+        self.assertIsNone(jvm_so)
+
+
+if __name__ == '__main__':
+    unittest.main()